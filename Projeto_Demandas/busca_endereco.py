@@ -0,0 +1,145 @@
+"""Busca tolerante a erros por DES_ENDERECO e NOM_BAIRRO.
+
+Os textos são normalizados sem acentos e quebrados em trigramas (como o
+pg_trgm). O índice invertido guarda, para cada trigrama, os textos distintos
+que o contêm; a consulta soma os trigramas em comum, cada um pesado pela sua
+raridade (IDF), e ordena pela fração do peso da consulta encontrada em cada
+texto, sem percorrer a base inteira.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from similaridade import normalizar_texto
+
+SIMILARIDADE_MINIMA = 0.5
+
+
+def trigramas(texto, prefixo=False):
+    """Trigramas de cada palavra, com preenchimento de espaços nas bordas.
+
+    Com `prefixo` a última palavra fica sem o espaço final, para que uma
+    palavra ainda sendo digitada case com o começo da palavra completa.
+    """
+    palavras = normalizar_texto(texto).split()
+    resultado = set()
+    for i, palavra in enumerate(palavras):
+        fim = "" if prefixo and i == len(palavras) - 1 else " "
+        palavra = "  " + palavra + fim
+        resultado.update(palavra[j:j + 3] for j in range(len(palavra) - 2))
+    return resultado
+
+
+def indexar_trigramas(textos):
+    """Índice invertido trigrama -> posições (np.int32) dos textos que o contêm"""
+    postings = {}
+    tamanhos = np.empty(len(textos), dtype=np.int32)
+    for posicao, texto in enumerate(textos):
+        grams = trigramas(texto)
+        tamanhos[posicao] = len(grams)
+        for gram in grams:
+            postings.setdefault(gram, []).append(posicao)
+
+    # Peso IDF: trigramas de palavras comuns ("jardim", "rua") valem pouco na nota
+    total = len(textos)
+    return {
+        'textos': list(textos),
+        'tamanhos': tamanhos,
+        'postings': {gram: np.asarray(posicoes, dtype=np.int32) for gram, posicoes in postings.items()},
+        'pesos': {gram: math.log((total + 1) / len(posicoes)) for gram, posicoes in postings.items()},
+        'peso_ausente': math.log(total + 1),
+    }
+
+
+def buscar_trigramas(indice, consulta, minimo=SIMILARIDADE_MINIMA):
+    """Posições e notas de todos os textos parecidos com a consulta, do mais ao menos parecido.
+
+    A nota é a fração do peso (IDF) dos trigramas da consulta presente no texto;
+    empates são desfeitos pela similaridade de Jaccard, que favorece textos mais curtos.
+    """
+    grams = trigramas(consulta, prefixo=True)
+    presentes = [gram for gram in grams if gram in indice['postings']]
+    if not presentes:
+        return np.empty(0, dtype=np.int32), np.empty(0)
+
+    # Trigramas que não existem no índice também contam no peso da consulta
+    peso_consulta = sum(indice['pesos'].get(gram, indice['peso_ausente']) for gram in grams)
+    listas = [indice['postings'][gram] for gram in presentes]
+    pesos = np.repeat([indice['pesos'][gram] for gram in presentes], [len(lista) for lista in listas])
+
+    posicoes, inverso, acertos = np.unique(np.concatenate(listas), return_inverse=True, return_counts=True)
+    nota = np.bincount(inverso, weights=pesos) / peso_consulta
+    jaccard = acertos / (len(grams) + indice['tamanhos'][posicoes] - acertos)
+
+    selecionados = nota >= minimo
+    posicoes, nota, jaccard = posicoes[selecionados], nota[selecionados], jaccard[selecionados]
+
+    ordem = np.lexsort((-jaccard, -nota))
+    return posicoes[ordem], nota[ordem]
+
+
+def construir_indice_enderecos(df_and, df_fin):
+    """Índices de trigramas de endereço + bairro e de sugestões (bairros e logradouros).
+
+    Demandas com o mesmo endereço e bairro compartilham uma entrada do índice.
+    """
+    # DAT_INICIO das finalizadas ainda vem como texto 'dd/mm/aaaa HH:MM'
+    linhas = pd.concat([
+        df[['DEMANDA', 'DES_ENDERECO', 'NOM_BAIRRO', 'DES_ELEMENTO', 'DES_SITUACAO', 'DAT_INICIO']].assign(
+            ORIGEM=origem, DAT_INICIO=pd.to_datetime(df['DAT_INICIO'], dayfirst=True, errors='coerce'))
+        for df, origem in [(df_and, 'Andamento'), (df_fin, 'Finalizada')]
+    ], ignore_index=True)
+
+    endereco = linhas['DES_ENDERECO'].fillna('').astype(str).str.strip()
+    bairro = linhas['NOM_BAIRRO'].fillna('').astype(str).str.strip()
+    local = (endereco + ' - ' + bairro).str.strip(' -')
+    codigos, locais = pd.factorize(local)
+
+    # Logradouro é o trecho antes da vírgula ("CENTENÁRIO, S/N - ..." -> "CENTENÁRIO")
+    logradouro = endereco.str.split(',').str[0].str.strip()
+    termos = pd.concat([bairro, logradouro], ignore_index=True)
+    termos = termos[termos != ''].value_counts()
+
+    # Linhas agrupadas por local, para recuperar as demandas de um local sem varrer a base
+    ordem = np.argsort(codigos, kind='stable')
+    inicios = np.searchsorted(codigos[ordem], np.arange(len(locais) + 1))
+
+    return {
+        'linhas': linhas,
+        'linhas_por_local': ordem,
+        'inicios': inicios,
+        'locais': indexar_trigramas(locais.tolist()),
+        'termos': indexar_trigramas(termos.index.tolist()),
+        'qtd_termos': termos.to_numpy(),
+    }
+
+
+def sugerir_enderecos(indice, consulta, limite=8):
+    """Sugestões de autocompletar: bairros e logradouros parecidos, com a quantidade de demandas"""
+    posicoes, _ = buscar_trigramas(indice['termos'], consulta)
+    posicoes = posicoes[:limite]
+    textos = indice['termos']['textos']
+    return [(textos[p], int(indice['qtd_termos'][p])) for p in posicoes]
+
+
+def buscar_enderecos(indice, consulta, limite=20, pagina=0):
+    """Demandas de uma página de `limite` endereços parecidos com a consulta, ordenadas pela nota.
+
+    Retorna (demandas, total de endereços encontrados), para a tela mostrar
+    quantos endereços ficaram nas outras páginas.
+    """
+    posicoes, nota = buscar_trigramas(indice['locais'], consulta)
+    total = len(posicoes)
+    posicoes = posicoes[pagina * limite:(pagina + 1) * limite]
+    nota = nota[pagina * limite:(pagina + 1) * limite]
+
+    inicios = indice['inicios']
+    blocos = [indice['linhas_por_local'][inicios[p]:inicios[p + 1]] for p in posicoes]
+    if not blocos:
+        return indice['linhas'].iloc[[]].assign(SIMILARIDADE=[]), total
+
+    # Os locais já vêm ordenados pela nota, então as linhas saem na mesma ordem
+    return indice['linhas'].iloc[np.concatenate(blocos)].assign(
+        SIMILARIDADE=np.repeat(nota, [len(bloco) for bloco in blocos])
+    ), total
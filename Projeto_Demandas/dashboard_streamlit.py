@@ -4,6 +4,11 @@ import matplotlib.pyplot as plt
 import numpy as np
 import locale
 
+from exportacao import FORMATOS, arquivo_em_cache, assinatura_filtros, exportar, ler_arquivo, versao_dados
+from facetas import FACETAS, TODOS, contar_facetas, indexar_facetas, mascara_selecoes, opcoes_faceta, rotulo_faceta
+from busca_endereco import buscar_enderecos, construir_indice_enderecos, sugerir_enderecos
+from similaridade import LIMIAR_MINIMO, LIMIAR_SIMILARIDADE, agrupar_recorrencias, buscar_similares, construir_indice
+
  #Configura o locale para Português Brasil
 try:
     locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
@@ -20,8 +25,34 @@ def format_currency(value):
 st.set_page_config(layout="wide")
 PATH_ANDAMENTO = r'Projeto_Demandas/Arquivos_Externos/ABERTAS.xls'
 PATH_FINALIZADA = r'Projeto_Demandas/Arquivos_Externos/FECHADAS.xls'
+ENDERECOS_POR_PAGINA = 20
+
+
+def export_results(nome, df, posicoes, colunas, assinatura, versao):
+    """Botões de exportação das linhas filtradas; o arquivo só é gerado quando pedido"""
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        formato = st.selectbox("Formato", list(FORMATOS), key=f"formato_{nome}")
+
+    # Arquivos já gerados para a mesma versão dos dados e os mesmos filtros são reaproveitados.
+    # `versao` é a mesma usada para carregar `df`, então dados e chave mudam juntos
+    caminho = arquivo_em_cache(colunas, formato, versao, assinatura)
 
-def search_demand(df_and, df_fin):
+    with col2:
+        if caminho is None and st.button(f"Gerar {formato} ({len(posicoes)} linhas)", key=f"gerar_{nome}"):
+            with st.spinner("Gerando arquivo..."):
+                caminho = exportar(df, posicoes, colunas, formato, versao, assinatura)
+
+        if caminho is not None:
+            extensao, mime = FORMATOS[formato]
+            # O arquivo só é lido no clique; se saiu do cache nesse meio tempo, é gerado de novo
+            st.download_button(
+                f"Baixar {formato}",
+                lambda: ler_arquivo(exportar(df, posicoes, colunas, formato, versao, assinatura)),
+                file_name=f"{nome}.{extensao}", mime=mime, key=f"baixar_{nome}"
+            )
+
+def search_demand(df_and, df_fin, similaridade, versao):
     st.sidebar.header("🔍 Pesquisar Demanda")
 
     # Verifica se a coluna 'DEMANDA' existe
@@ -37,8 +68,10 @@ def search_demand(df_and, df_fin):
             search_term = int(search_term)
 
             # Pesquisa exata (para números de demanda)
-            result_and = df_and[df_and['DEMANDA'].astype(int) == search_term]
-            result_fin = df_fin[df_fin['DEMANDA'].astype(int) == search_term]
+            mask_and = (df_and['DEMANDA'].astype(int) == search_term).to_numpy()
+            mask_fin = (df_fin['DEMANDA'].astype(int) == search_term).to_numpy()
+            result_and = df_and[mask_and]
+            result_fin = df_fin[mask_fin]
 
             if not result_and.empty or not result_fin.empty:
                 st.subheader(f"Resultados para demanda: {search_term}")
@@ -49,6 +82,9 @@ def search_demand(df_and, df_fin):
                             result_and[['DEMANDA', 'DES_SOLICITACAO', 'DES_INSTRUCAO', 'DAT_INICIO']]
                             .style.format({'DAT_INICIO': lambda x: x.strftime('%d/%m/%Y')})
                         )
+                        export_results(f"demanda_{search_term}_andamento", df_and, np.flatnonzero(mask_and),
+                                       ['DEMANDA', 'DES_SOLICITACAO', 'DES_INSTRUCAO', 'DAT_INICIO'],
+                                       assinatura_filtros(tabela='andamento', demanda=search_term), versao)
 
                 if not result_fin.empty:
                     with st.expander("Demandas Finalizadas", expanded=True):
@@ -71,14 +107,79 @@ def search_demand(df_and, df_fin):
                                 'DAT_INICIO': lambda x: x.strftime('%d/%m/%Y') if not pd.isna(x) else 'N/A'
                             })
                         )
+                        export_results(f"demanda_{search_term}_finalizada", df_fin, np.flatnonzero(mask_fin),
+                                       ['DEMANDA', 'DES_SOLICITACAO', 'VLR_TOTAL', 'DAT_INICIO', 'DES_INSTRUCAO'],
+                                       assinatura_filtros(tabela='finalizada', demanda=search_term), versao)
+
+                # Demandas com instrução parecida no mesmo elemento
+                similares = buscar_similares(similaridade, search_term)
+                if not similares.empty:
+                    with st.expander(f"Possíveis duplicadas ou recorrências ({len(similares)})", expanded=False):
+                        st.dataframe(
+                            similares[['DEMANDA', 'ORIGEM', 'DES_ELEMENTO', 'DAT_INICIO', 'SIMILARIDADE', 'DES_INSTRUCAO']]
+                            .style.format({
+                                'SIMILARIDADE': '{:.0%}',
+                                'DAT_INICIO': lambda x: x.strftime('%d/%m/%Y') if pd.notnull(x) else ''
+                            })
+                        )
             else:
                 st.warning(f"Nenhuma demanda encontrada com o número: {search_term}")
         except Exception as e:
             st.error(f"Erro na pesquisa: {str(e)}")
 
 
-@st.cache_data
-def tratamento(file_path_andamento, file_path_finalizada):
+def search_address(enderecos):
+    st.sidebar.header("📍 Pesquisar Endereço")
+
+    # Bairros e logradouros conhecidos, filtrados pelo navegador enquanto o usuário digita
+    # (trecho do texto, sem diferenciar maiúsculas); um texto livre (com erro de digitação,
+    # por exemplo) é aceito ao pressionar Enter
+    termos = enderecos['termos']['textos']
+    search_term = st.sidebar.selectbox(
+        "Digite o endereço ou bairro:", termos, index=None, accept_new_options=True,
+        filter_mode="contains", placeholder="Ex.: Centenário, Europark"
+    )
+    if not search_term or not search_term.strip():
+        return
+    search_term = search_term.strip()
+
+    # Texto livre: sugere os bairros e logradouros mais parecidos pelo índice de trigramas
+    sugestoes = sugerir_enderecos(enderecos, search_term) if search_term not in termos else []
+    if sugestoes:
+        quantidades = dict(sugestoes)
+        opcoes = [search_term] + [texto for texto in quantidades if texto != search_term]
+        search_term = st.sidebar.selectbox(
+            "Sugestões", opcoes, format_func=lambda x: f"{x} ({quantidades[x]})" if x in quantidades else x
+        )
+
+    resultado, total = buscar_enderecos(enderecos, search_term, ENDERECOS_POR_PAGINA)
+    if resultado.empty:
+        st.warning(f"Nenhum endereço encontrado para: {search_term}")
+        return
+
+    st.subheader(f"Demandas no endereço: {search_term}")
+    if total > ENDERECOS_POR_PAGINA:
+        paginas = -(-total // ENDERECOS_POR_PAGINA)
+        # A chave inclui a pesquisa, então uma nova pesquisa volta para a primeira página
+        pagina = st.number_input(f"Página (de {paginas})", 1, paginas, key=f"pagina_endereco_{search_term}")
+        st.caption(f"{total} endereços encontrados, {ENDERECOS_POR_PAGINA} por página, do mais parecido "
+                   f"para o menos")
+        if pagina > 1:
+            resultado, _ = buscar_enderecos(enderecos, search_term, ENDERECOS_POR_PAGINA, pagina - 1)
+    st.dataframe(
+        resultado[['DEMANDA', 'ORIGEM', 'DES_ENDERECO', 'NOM_BAIRRO', 'DES_ELEMENTO', 'DES_SITUACAO', 'DAT_INICIO',
+                   'SIMILARIDADE']]
+        .style.format({
+            'SIMILARIDADE': '{:.0%}',
+            'DAT_INICIO': lambda x: x.strftime('%d/%m/%Y') if pd.notnull(x) else ''
+        })
+    )
+
+
+# `versao` (data de modificação e tamanho dos arquivos) só entra na chave do cache,
+# para os dados serem relidos quando os XLS forem substituídos
+@st.cache_data(max_entries=1)
+def tratamento(file_path_andamento, file_path_finalizada, versao=None):
     # Lendo os arquivos XLS
     demanda_and = pd.read_excel(file_path_andamento, sheet_name=0)
     demanda_fin = pd.read_excel(file_path_finalizada, sheet_name=0)
@@ -119,7 +220,33 @@ def tratamento(file_path_andamento, file_path_finalizada):
 
     return demanda_fin, demanda_and
 
-def show_team_analysis(df_and, df_fin):
+
+# O índice é só de leitura, então fica em cache_resource para não ser copiado a cada rerun
+@st.cache_resource(max_entries=1)
+def carregar_facetas(file_path_andamento, file_path_finalizada, versao):
+    demanda_fin, demanda_and = tratamento(file_path_andamento, file_path_finalizada, versao)
+    return indexar_facetas(demanda_and, demanda_fin)
+
+
+# Assinaturas MinHash e tabelas LSH das instruções, calculadas uma vez na carga dos dados
+@st.cache_resource(max_entries=1)
+def carregar_similaridade(file_path_andamento, file_path_finalizada, versao):
+    demanda_fin, demanda_and = tratamento(file_path_andamento, file_path_finalizada, versao)
+    return construir_indice(demanda_and, demanda_fin)
+
+
+# Índice de trigramas de endereço e bairro, calculado uma vez na carga dos dados
+@st.cache_resource(max_entries=1)
+def carregar_enderecos(file_path_andamento, file_path_finalizada, versao):
+    demanda_fin, demanda_and = tratamento(file_path_andamento, file_path_finalizada, versao)
+    return construir_indice_enderecos(demanda_and, demanda_fin)
+
+
+@st.cache_data
+def carregar_recorrencias(file_path_andamento, file_path_finalizada, versao, limiar):
+    return agrupar_recorrencias(carregar_similaridade(file_path_andamento, file_path_finalizada, versao), limiar)
+
+def show_team_analysis(df_and, df_fin, facetas, versao):
     st.subheader("Demandas por Filtros")
 
     # 1. Pré-processamento dos dados
@@ -127,47 +254,21 @@ def show_team_analysis(df_and, df_fin):
     df_fin['DAT_INICIO'] = pd.to_datetime(df_fin['DAT_INICIO'], dayfirst=True, errors='coerce')
     #df_fin['VLR_TOTAL'] = pd.to_numeric(df_fin['VLR_TOTAL'], errors='coerce').fillna(0)
 
-    # 2. Criar opções para os filtros com "TODOS"
-    def get_filter_options(column, df):
-        options = df[column].unique().tolist()
-        options.insert(0, "TODOS")
-        return options
-
-    # 3. Filtros interativos
+    # 2. Layout dos filtros. As caixas de seleção são preenchidas por último,
+    # pois as contagens dependem da palavra-chave e do período
     col1, col2, col3, col4, col5,col6 = st.columns(6)
-    with col1:
-        abrangencia_options = get_filter_options('DES_ABRANGENCIA', df_and)
-        abrangencia = st.selectbox("Abrangência", abrangencia_options)
-
-    with col2:
-        #if
-        elemento_options = get_filter_options('DES_ELEMENTO', df_and)
-        elemento = st.selectbox("Elemento", elemento_options)
-
-    with col3:
-        equipe_options = get_filter_options('DES_EQUIPE', df_and)
-        equipe = st.selectbox("Equipe", equipe_options)
+    st.write("Selecione o período de análise:")
+    col7, col8 = st.columns(2)
 
     with col4:
         # Novo filtro por palavra-chave na instrução
         keyword = st.text_input("Palavra-chave na Instrução")
 
-    with col5:
-        # Novo filtro por palavra-chave na instrução
-        situacao_options = get_filter_options('DES_SITUACAO', df_and)
-        situacao_options.insert(0, "CONCLUIDO")
-        situacao_options.insert(0, "CANCELADO")
-        situacao = st.selectbox("SITUAÃÇO", situacao_options)
-
     with col6:
         # Novo filtro por palavra-chave na instrução
         ret_keyword = st.text_input("Palavra-chave na Retaguarda")
 
-
-
-    # 4. Seleção de período
-    st.write("Selecione o período de análise:")
-    col7, col8 = st.columns(2)
+    # 3. Seleção de período
     with col7:
         start_date = st.date_input("Data inicial", value=df_and['DAT_INICIO'].min().date())
     with col8:
@@ -175,7 +276,7 @@ def show_team_analysis(df_and, df_fin):
 
     end_date_plus_1 = pd.to_datetime(end_date) + pd.Timedelta(days=1)
 
-    # 5. Aplicar filtros
+    # 4. Filtros de período e palavra-chave
     mask_and = (
             (df_and['DAT_INICIO'] >= pd.to_datetime(start_date)) &
             (df_and['DAT_INICIO'] < end_date_plus_1)
@@ -185,39 +286,52 @@ def show_team_analysis(df_and, df_fin):
             (df_fin['DAT_INICIO'] < end_date_plus_1)
     )
 
-    # Aplicar filtros adicionais se não for "TODOS"
-    if abrangencia != "TODOS":
-        mask_and &= (df_and['DES_ABRANGENCIA'] == abrangencia)
-        mask_fin &= (df_fin['DES_ABRANGENCIA'] == abrangencia)
-
-    if elemento != "TODOS":
-        mask_and &= (df_and['DES_ELEMENTO'] == elemento)
-        mask_fin &= (df_fin['DES_ELEMENTO'] == elemento)
-
-    if equipe != "TODOS":
-        mask_and &= (df_and['DES_EQUIPE'] == equipe)
-        mask_fin &= (df_fin['DES_EQUIPE'] == equipe)
-
-    if situacao != "TODOS":
-        mask_and &= (df_and['DES_SITUACAO'] == situacao)
-        mask_fin &= (df_fin['DES_SITUACAO'] == situacao)
-
-
     # Aplicar filtro por palavra-chave se foi informado
     if keyword:
         mask_and &= (df_and['DES_INSTRUCAO'].str.contains(keyword, case=False, na=False))
         mask_fin &= (df_fin['DES_INSTRUCAO'].str.contains(keyword, case=False, na=False))
 
-    #filtered_and = df_and[mask_and]
-    #filtered_fin = df_fin[mask_fin]
-
-    # Aplicar filtro por palavra-chave se foi informado
-    if keyword:
+    if ret_keyword:
         mask_and &= (df_and['DES_OBSERVACAO_RETAGUARDA'].str.contains(ret_keyword, case=False, na=False))
         mask_fin &= (df_fin['DES_OBSERVACAO_RETAGUARDA'].str.contains(ret_keyword, case=False, na=False))
 
-    filtered_and = df_and[mask_and]
-    filtered_fin = df_fin[mask_fin]
+    mascara_base = np.concatenate([mask_and.to_numpy(), mask_fin.to_numpy()])
+
+    # 5. Filtros por faceta, com a contagem de demandas (abertas + encerradas) de cada opção
+    # O valor atual de cada caixa já está no session_state no início do rerun,
+    # então as contagens de todas as facetas usam a seleção mais recente
+    selecoes = {}
+    for coluna in FACETAS:
+        valor = st.session_state.get(f"faceta_{coluna}", TODOS)
+        selecoes[coluna] = valor if valor in facetas['colunas'][coluna]['posicoes'] else TODOS
+
+    contagens = contar_facetas(facetas, mascara_base, selecoes)
+
+    def filtro_faceta(label, coluna):
+        opcoes = opcoes_faceta(facetas, contagens, coluna, selecoes[coluna])
+        return st.selectbox(label, opcoes, index=opcoes.index(selecoes[coluna]),
+                            format_func=rotulo_faceta(facetas, contagens, coluna), key=f"faceta_{coluna}")
+
+    with col1:
+        selecoes['DES_ABRANGENCIA'] = filtro_faceta("Abrangência", 'DES_ABRANGENCIA')
+
+    with col2:
+        selecoes['DES_ELEMENTO'] = filtro_faceta("Elemento", 'DES_ELEMENTO')
+
+    with col3:
+        selecoes['DES_EQUIPE'] = filtro_faceta("Equipe", 'DES_EQUIPE')
+
+    with col5:
+        # Opções vêm das duas bases, então CONCLUIDO/CANCELADO aparecem quando existirem
+        selecoes['DES_SITUACAO'] = filtro_faceta("SITUAÃÇO", 'DES_SITUACAO')
+
+    mascara = mascara_selecoes(facetas, mascara_base, selecoes)
+
+    filtered_and = df_and[mascara[:facetas['n_and']]]
+    filtered_fin = df_fin[mascara[facetas['n_and']:]]
+
+    # Identifica a combinação de filtros para reaproveitar exportações já geradas
+    filtros = dict(selecoes=selecoes, keyword=keyword, ret_keyword=ret_keyword, inicio=start_date, fim=end_date)
 
 
     # 6. Exibir resultados
@@ -245,6 +359,10 @@ def show_team_analysis(df_and, df_fin):
                     ['DEMANDA', 'DES_ABRANGENCIA', 'DES_ELEMENTO', 'DES_EQUIPE', 'DAT_INICIO', 'DES_INSTRUCAO','DES_OBSERVACAO_RETAGUARDA']]
                 .style.format({'DAT_INICIO': lambda x: x.strftime('%d/%m/%Y %H:%M') if pd.notnull(x) else ''})
             )
+            export_results("demandas_abertas", df_and, np.flatnonzero(mascara[:facetas['n_and']]),
+                           ['DEMANDA', 'DES_ABRANGENCIA', 'DES_ELEMENTO', 'DES_EQUIPE', 'DAT_INICIO', 'DES_INSTRUCAO',
+                            'DES_OBSERVACAO_RETAGUARDA'],
+                           assinatura_filtros(tabela='abertas', **filtros), versao)
         else:
             st.warning("Nenhuma demanda aberta encontrada com os filtros selecionados")
 
@@ -256,9 +374,37 @@ def show_team_analysis(df_and, df_fin):
                 #.assign(VLR_TOTAL=filtered_fin['VLR_TOTAL'].apply(format_currency))
                 .style.format({'DAT_INICIO': lambda x: x.strftime('%d/%m/%Y %H:%M') if pd.notnull(x) else ''})
             )
+            export_results("demandas_encerradas", df_fin, np.flatnonzero(mascara[facetas['n_and']:]),
+                           ['DEMANDA', 'DES_ABRANGENCIA', 'DES_ELEMENTO', 'DES_EQUIPE', 'DAT_INICIO', 'VLR_TOTAL',
+                            'DES_INSTRUCAO', 'DES_OBSERVACAO_RETAGUARDA'],
+                           assinatura_filtros(tabela='encerradas', **filtros), versao)
         else:
             st.warning("Nenhuma demanda encerrada encontrada com os filtros selecionados")
 
+def show_recurring_demands(versao):
+    st.subheader("Demandas Recorrentes por Elemento")
+    st.caption("Grupos de demandas do mesmo elemento com instruções parecidas")
+
+    limiar = st.slider("Similaridade mínima", LIMIAR_MINIMO, 1.0, LIMIAR_SIMILARIDADE, 0.05)
+    grupos = carregar_recorrencias(PATH_ANDAMENTO, PATH_FINALIZADA, versao, limiar)
+
+    if grupos.empty:
+        st.info("Nenhuma demanda recorrente encontrada")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Grupos de recorrência", len(grupos))
+    with col2:
+        st.metric("Demandas envolvidas", int(grupos['QTD_DEMANDAS'].sum()))
+
+    st.dataframe(
+        grupos.style.format({
+            'PRIMEIRA': lambda x: x.strftime('%d/%m/%Y') if pd.notnull(x) else '',
+            'ULTIMA': lambda x: x.strftime('%d/%m/%Y') if pd.notnull(x) else '',
+        })
+    )
+
 #analisee temporal
 # def show_temporal_analysis(df_and, df_fin):
 #     st.subheader("Análise temporal")
@@ -381,17 +527,22 @@ def show_team_analysis(df_and, df_fin):
 
 def load_data():
     """Carrega os dados fixos uma vez e mantém em cache"""
-    return tratamento(PATH_ANDAMENTO, PATH_FINALIZADA)
+    return tratamento(PATH_ANDAMENTO, PATH_FINALIZADA, versao_dados(PATH_ANDAMENTO, PATH_FINALIZADA))
 
 
 def main():
     st.title("📊 SEMAE ELETROMECÂNICA")
 
     # Carrega dados
-    demanda_fin, demanda_and = tratamento(PATH_ANDAMENTO, PATH_FINALIZADA)
+    versao = versao_dados(PATH_ANDAMENTO, PATH_FINALIZADA)
+    demanda_fin, demanda_and = tratamento(PATH_ANDAMENTO, PATH_FINALIZADA, versao)
+    facetas = carregar_facetas(PATH_ANDAMENTO, PATH_FINALIZADA, versao)
+    similaridade = carregar_similaridade(PATH_ANDAMENTO, PATH_FINALIZADA, versao)
+    enderecos = carregar_enderecos(PATH_ANDAMENTO, PATH_FINALIZADA, versao)
 
     # Adiciona pesquisa
-    search_demand(demanda_and, demanda_fin)
+    search_demand(demanda_and, demanda_fin, similaridade, versao)
+    search_address(enderecos)
 
     # Processamento adicional
     demanda_and['delay_days'] = (
@@ -400,10 +551,13 @@ def main():
     ).dt.days
 
     # Abas do dashboard
-    tab1, = st.tabs([ "Análise de Demandas",])
+    tab1, tab2 = st.tabs([ "Análise de Demandas", "Demandas Recorrentes"])
 
     with tab1:
-        show_team_analysis(demanda_and, demanda_fin)
+        show_team_analysis(demanda_and, demanda_fin, facetas, versao)
+
+    with tab2:
+        show_recurring_demands(versao)
 
 
 if __name__ == "__main__":
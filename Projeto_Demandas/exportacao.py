@@ -0,0 +1,193 @@
+"""Exportação dos resultados filtrados para CSV, XLSX e Parquet.
+
+Os arquivos são escritos em blocos de linhas direto em disco, a partir das
+posições filtradas, sem montar uma cópia do DataFrame filtrado inteiro. Cada
+arquivo gerado fica num cache em disco identificado por (versão dos dados,
+assinatura dos filtros, formato) e é reaproveitado entre sessões; arquivos
+antigos ou pouco usados são removidos quando a pasta passa dos limites.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+TAMANHO_BLOCO = 50_000
+PASTA_CACHE = os.path.join(tempfile.gettempdir(), 'demandas_exportacoes')
+IDADE_MAXIMA_CACHE = 24 * 60 * 60  # segundos sem uso
+TAMANHO_MAXIMO_CACHE = 2 * 2 ** 30  # bytes
+# Colunas de valor que podem chegar como texto/object (ex.: VLR_TOTAL das finalizadas)
+COLUNAS_NUMERICAS = ['VLR_TOTAL']
+
+FORMATOS = {
+    'CSV': ('csv', 'text/csv'),
+    'XLSX': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'Parquet': ('parquet', 'application/octet-stream'),
+}
+
+
+def versao_dados(*caminhos):
+    """Versão dos arquivos de origem (data de modificação e tamanho)"""
+    versao = []
+    for caminho in caminhos:
+        info = os.stat(caminho)
+        versao.append(f"{caminho}:{info.st_mtime_ns}:{info.st_size}")
+    return '|'.join(versao)
+
+
+def assinatura_filtros(**filtros):
+    """Texto estável que identifica a combinação de filtros aplicada"""
+    return json.dumps(filtros, sort_keys=True, default=str, ensure_ascii=False)
+
+
+def _caminho_cache(colunas, formato, versao, assinatura):
+    extensao, _ = FORMATOS[formato]
+    chave = hashlib.sha1(f"{versao}|{assinatura}|{colunas}".encode('utf-8')).hexdigest()
+    return os.path.join(PASTA_CACHE, f"{chave}.{extensao}")
+
+
+def _marcar_uso(caminho):
+    """Atualiza a data do arquivo (usada pela limpeza); False se ele não existe mais"""
+    try:
+        os.utime(caminho)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def limpar_cache(manter=None, idade_maxima=IDADE_MAXIMA_CACHE, tamanho_maximo=TAMANHO_MAXIMO_CACHE):
+    """Remove exportações sem uso há mais de `idade_maxima` e, se a pasta ainda
+    passar de `tamanho_maximo`, as usadas há mais tempo primeiro.
+    """
+    agora = time.time()
+    arquivos = []
+    try:
+        entradas = list(os.scandir(PASTA_CACHE))
+    except FileNotFoundError:
+        return
+
+    for entrada in entradas:
+        try:
+            info = entrada.stat()
+            # Temporários de escritas em andamento só saem quando ficam velhos
+            if agora - info.st_mtime > idade_maxima:
+                os.remove(entrada.path)
+            elif not entrada.name.endswith('.tmp') and entrada.path != manter:
+                arquivos.append((info.st_mtime, info.st_size, entrada.path))
+        except FileNotFoundError:
+            # Outra sessão removeu o arquivo ao mesmo tempo
+            continue
+
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= tamanho_maximo:
+            break
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+        total -= tamanho
+
+
+def _numerico(serie):
+    """Valores como float64; textos com vírgula decimal ('12,5') também são convertidos"""
+    if serie.dtype == object or pd.api.types.is_string_dtype(serie):
+        serie = serie.map(lambda valor: valor.replace(',', '.') if isinstance(valor, str) else valor)
+    return pd.to_numeric(serie, errors='coerce').astype('float64')
+
+
+def _blocos(df, posicoes, colunas, tamanho_bloco):
+    # Seleciona linhas e colunas de uma vez, sem copiar as demais colunas do bloco
+    indices_colunas = df.columns.get_indexer(colunas)
+    if (indices_colunas < 0).any():
+        raise KeyError(f"Colunas ausentes: {[c for c, i in zip(colunas, indices_colunas) if i < 0]}")
+    numericas = [coluna for coluna in colunas if coluna in COLUNAS_NUMERICAS]
+    # Sempre ao menos um bloco, mesmo vazio, para o arquivo sair com o cabeçalho
+    for inicio in range(0, max(len(posicoes), 1), tamanho_bloco):
+        bloco = df.iloc[posicoes[inicio:inicio + tamanho_bloco], indices_colunas]
+        # Numéricas de verdade: o CSV usa a vírgula decimal e o Parquet mantém o tipo
+        yield bloco.assign(**{coluna: _numerico(bloco[coluna]) for coluna in numericas})
+
+
+def _escrever_csv(caminho, blocos):
+    # utf-8-sig para o Excel abrir com acentuação correta
+    with open(caminho, 'w', encoding='utf-8-sig', newline='') as arquivo:
+        for i, bloco in enumerate(blocos):
+            bloco.to_csv(arquivo, sep=';', decimal=',', date_format='%d/%m/%Y %H:%M', index=False, header=i == 0)
+
+
+def _escrever_xlsx(caminho, blocos, colunas):
+    from openpyxl import Workbook
+
+    # write_only não mantém as células em memória
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet("Demandas")
+    planilha.append(colunas)
+    for bloco in blocos:
+        bloco = bloco.astype(object).where(bloco.notna(), None)
+        for linha in bloco.itertuples(index=False):
+            planilha.append(list(linha))
+    livro.save(caminho)
+
+
+def _escrever_parquet(caminho, blocos):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    escritor = None
+    try:
+        for bloco in blocos:
+            # Colunas de texto como string para o schema não variar entre blocos
+            texto = bloco.select_dtypes(include='object').columns
+            bloco = bloco.astype({coluna: 'string' for coluna in texto})
+            tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(caminho, tabela.schema)
+            escritor.write_table(tabela.cast(escritor.schema))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+def exportar(df, posicoes, colunas, formato, versao, assinatura, tamanho_bloco=TAMANHO_BLOCO):
+    """Gera (ou reaproveita do cache) o arquivo com as linhas `posicoes` de `df`.
+
+    Retorna o caminho do arquivo. A escrita é feita num arquivo temporário e
+    renomeada no final, então sessões simultâneas nunca leem um arquivo pela metade.
+    """
+    caminho = _caminho_cache(colunas, formato, versao, assinatura)
+    if _marcar_uso(caminho):
+        return caminho
+
+    os.makedirs(PASTA_CACHE, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=PASTA_CACHE, suffix='.tmp')
+    os.close(descritor)
+    try:
+        blocos = _blocos(df, posicoes, colunas, tamanho_bloco)
+        if formato == 'CSV':
+            _escrever_csv(temporario, blocos)
+        elif formato == 'XLSX':
+            _escrever_xlsx(temporario, blocos, colunas)
+        else:
+            _escrever_parquet(temporario, blocos)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+    limpar_cache(manter=caminho)
+    return caminho
+
+
+def ler_arquivo(caminho):
+    """Conteúdo do arquivo exportado, lido só quando o download é pedido"""
+    with open(caminho, 'rb') as arquivo:
+        return arquivo.read()
+
+
+def arquivo_em_cache(colunas, formato, versao, assinatura):
+    """Caminho do arquivo já exportado para esta combinação, ou None"""
+    caminho = _caminho_cache(colunas, formato, versao, assinatura)
+    return caminho if _marcar_uso(caminho) else None
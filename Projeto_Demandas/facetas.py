@@ -0,0 +1,104 @@
+"""Contagem de facetas para os filtros do dashboard.
+
+As colunas de filtro são codificadas uma única vez como inteiros (códigos de
+categoria) sobre andamento + finalizadas concatenados. A cada rerun as
+contagens saem de máscaras booleanas e np.bincount, sem groupby nem cópias
+dos DataFrames.
+"""
+import numpy as np
+import pandas as pd
+
+FACETAS = ['DES_ABRANGENCIA', 'DES_ELEMENTO', 'DES_EQUIPE', 'DES_SITUACAO']
+TODOS = "TODOS"
+
+
+def indexar_facetas(df_and, df_fin, colunas=FACETAS):
+    """Codifica as colunas de filtro das duas bases num índice colunar.
+
+    As linhas de andamento vêm primeiro e as finalizadas depois, na mesma
+    ordem posicional dos DataFrames recebidos. Valores nulos recebem o código -1.
+    """
+    indice = {'n_and': len(df_and), 'n_fin': len(df_fin), 'colunas': {}}
+    for coluna in colunas:
+        valores = pd.concat([
+            df_and[coluna] if coluna in df_and.columns else pd.Series(np.nan, index=df_and.index),
+            df_fin[coluna] if coluna in df_fin.columns else pd.Series(np.nan, index=df_fin.index),
+        ], ignore_index=True)
+        codigos, categorias = pd.factorize(valores.astype('string'), sort=True)
+        indice['colunas'][coluna] = {
+            'categorias': categorias.tolist(),
+            'posicoes': {valor: i for i, valor in enumerate(categorias)},
+            'codigos': codigos.astype(np.int32),
+        }
+    return indice
+
+
+def _mascara_valor(faceta, valor):
+    codigo = faceta['posicoes'].get(valor)
+    if codigo is None:
+        return np.zeros(len(faceta['codigos']), dtype=bool)
+    return faceta['codigos'] == codigo
+
+
+def mascara_selecoes(indice, mascara_base, selecoes, ignorar=None):
+    """Aplica à máscara base todas as seleções diferentes de "TODOS", exceto `ignorar`"""
+    mascara = mascara_base.copy()
+    for coluna, valor in selecoes.items():
+        if coluna != ignorar and valor != TODOS:
+            mascara &= _mascara_valor(indice['colunas'][coluna], valor)
+    return mascara
+
+
+def contar_facetas(indice, mascara_base, selecoes):
+    """Contagem de cada valor de cada faceta, dados os demais filtros ativos.
+
+    Para a faceta X a contagem considera todos os filtros menos o da própria
+    X (cross-filtering), assim o usuário vê quantas demandas teria ao trocar X.
+    Retorna {coluna: {'por_valor': np.ndarray com uma contagem por categoria,
+    'total': linhas que passam nos demais filtros, inclusive as de valor nulo}}.
+    """
+    # Máscara de cada seleção ativa calculada uma vez e reaproveitada por todas as facetas
+    ativas = {
+        coluna: _mascara_valor(indice['colunas'][coluna], valor)
+        for coluna, valor in selecoes.items() if valor != TODOS
+    }
+
+    contagens = {}
+    for coluna, faceta in indice['colunas'].items():
+        mascara = mascara_base.copy()
+        for outra, mascara_outra in ativas.items():
+            if outra != coluna:
+                mascara &= mascara_outra
+
+        # Código -1 (nulo) vai para a posição 0 e é descartado
+        contagem = np.bincount(faceta['codigos'][mascara] + 1, minlength=len(faceta['categorias']) + 1)
+        contagens[coluna] = {'por_valor': contagem[1:], 'total': int(mascara.sum())}
+    return contagens
+
+
+def opcoes_faceta(indice, contagens, coluna, selecionado):
+    """Opções do selectbox: "TODOS" e os valores com demandas, mais o selecionado.
+
+    Valores sem nenhuma demanda nos demais filtros são omitidos para evitar
+    combinações que retornam resultado vazio.
+    """
+    categorias = indice['colunas'][coluna]['categorias']
+    contagem = contagens[coluna]['por_valor']
+    return [TODOS] + [valor for valor, n in zip(categorias, contagem) if n > 0 or valor == selecionado]
+
+
+def rotulo_faceta(indice, contagens, coluna):
+    """format_func do selectbox: valor seguido da contagem"""
+    posicoes = indice['colunas'][coluna]['posicoes']
+    contagem = contagens[coluna]['por_valor']
+    # "TODOS" também retorna as demandas sem valor nesta coluna
+    total = contagens[coluna]['total']
+
+    def formatar(valor):
+        if valor == TODOS:
+            return f"{TODOS} ({total})"
+        posicao = posicoes.get(valor)
+        n = int(contagem[posicao]) if posicao is not None else 0
+        return f"{valor} ({n})"
+
+    return formatar
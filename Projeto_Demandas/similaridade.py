@@ -0,0 +1,202 @@
+"""Detecção de demandas duplicadas/recorrentes pelo texto da instrução.
+
+Cada DES_INSTRUCAO normalizada vira um conjunto de shingles de caracteres, que
+é resumido numa assinatura MinHash. As assinaturas são divididas em bandas e
+indexadas por LSH (locality-sensitive hashing): só demandas que caem no mesmo
+bucket em alguma banda são comparadas, então a consulta não percorre a base.
+"""
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+import pandas as pd
+
+NUM_PERMUTACOES = 128
+BANDAS = 32
+TAMANHO_SHINGLE = 5
+LIMIAR_SIMILARIDADE = 0.5
+# O LSH encontra os pares a partir de ~(1/BANDAS)^(BANDAS/NUM_PERMUTACOES) ≈ 0.42;
+# abaixo disso os grupos sairiam incompletos sem aviso
+LIMIAR_MINIMO = 0.45
+
+_PRIMO = np.uint64((1 << 61) - 1)
+_MASCARA_32 = np.uint64(0xFFFFFFFF)
+_VAZIO = np.uint32(0xFFFFFFFF)
+
+
+def normalizar_texto(texto):
+    """Minúsculas, sem acentos, sem pontuação e com espaços simples"""
+    if not isinstance(texto, str):
+        return ""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'[^a-z0-9]+', ' ', texto)
+    return texto.strip()
+
+
+def shingles(texto, tamanho=TAMANHO_SHINGLE):
+    """Conjunto de hashes (crc32) dos n-gramas de caracteres do texto normalizado"""
+    if not texto:
+        return np.empty(0, dtype=np.uint64)
+    if len(texto) <= tamanho:
+        pedacos = {texto}
+    else:
+        pedacos = {texto[i:i + tamanho] for i in range(len(texto) - tamanho + 1)}
+    return np.fromiter((zlib.crc32(p.encode('utf-8')) for p in pedacos), dtype=np.uint64, count=len(pedacos))
+
+
+def gerar_permutacoes(num_permutacoes=NUM_PERMUTACOES, semente=1):
+    """Coeficientes (a, b) das funções de hash a*x + b mod p da MinHash"""
+    rng = np.random.default_rng(semente)
+    a = rng.integers(1, int(_PRIMO), size=num_permutacoes, dtype=np.uint64)
+    b = rng.integers(0, int(_PRIMO), size=num_permutacoes, dtype=np.uint64)
+    return a, b
+
+
+def assinatura_minhash(hashes, permutacoes):
+    """Assinatura MinHash de um conjunto de shingles (uint32, uma posição por permutação)"""
+    a, b = permutacoes
+    if len(hashes) == 0:
+        return np.full(len(a), _VAZIO, dtype=np.uint32)
+    # O overflow do uint64 na multiplicação é intencional, como nas implementações usuais
+    with np.errstate(over='ignore'):
+        valores = (np.outer(hashes, a) + b) % _PRIMO & _MASCARA_32
+    return valores.min(axis=0).astype(np.uint32)
+
+
+def similaridade_estimada(assinatura_a, assinatura_b):
+    """Estimativa do índice de Jaccard: fração de posições iguais nas assinaturas"""
+    return float(np.mean(assinatura_a == assinatura_b))
+
+
+def construir_indice(df_and, df_fin, num_permutacoes=NUM_PERMUTACOES, bandas=BANDAS):
+    """Calcula as assinaturas das duas bases e monta as tabelas LSH.
+
+    As linhas de andamento vêm primeiro e as finalizadas depois, na mesma
+    ordem posicional dos DataFrames recebidos.
+    """
+    if num_permutacoes % bandas:
+        raise ValueError("num_permutacoes deve ser múltiplo de bandas")
+
+    # DAT_INICIO das finalizadas ainda vem como texto 'dd/mm/aaaa HH:MM'
+    linhas = pd.concat([
+        df[['DEMANDA', 'DES_ELEMENTO', 'DES_INSTRUCAO', 'DAT_INICIO']].assign(
+            ORIGEM=origem, DAT_INICIO=pd.to_datetime(df['DAT_INICIO'], dayfirst=True, errors='coerce'))
+        for df, origem in [(df_and, 'Andamento'), (df_fin, 'Finalizada')]
+    ], ignore_index=True)
+
+    permutacoes = gerar_permutacoes(num_permutacoes)
+    assinaturas = np.empty((len(linhas), num_permutacoes), dtype=np.uint32)
+    vazias = np.zeros(len(linhas), dtype=bool)
+    for i, texto in enumerate(linhas['DES_INSTRUCAO']):
+        hashes = shingles(normalizar_texto(texto))
+        vazias[i] = len(hashes) == 0
+        assinaturas[i] = assinatura_minhash(hashes, permutacoes)
+
+    linhas_por_banda = num_permutacoes // bandas
+    buckets = [{} for _ in range(bandas)]
+    for i in np.flatnonzero(~vazias):
+        for banda in range(bandas):
+            chave = assinaturas[i, banda * linhas_por_banda:(banda + 1) * linhas_por_banda].tobytes()
+            buckets[banda].setdefault(chave, []).append(i)
+
+    return {
+        'linhas': linhas,
+        # DEMANDA -> posições, para a busca por número não varrer as linhas
+        'posicoes_demanda': linhas.groupby(linhas['DEMANDA'].astype(int)).indices,
+        'n_and': len(df_and),
+        'permutacoes': permutacoes,
+        'assinaturas': assinaturas,
+        'vazias': vazias,
+        'linhas_por_banda': linhas_por_banda,
+        'buckets': buckets,
+    }
+
+
+def _candidatos(indice, assinatura):
+    linhas_por_banda = indice['linhas_por_banda']
+    candidatos = set()
+    for banda, tabela in enumerate(indice['buckets']):
+        chave = assinatura[banda * linhas_por_banda:(banda + 1) * linhas_por_banda].tobytes()
+        candidatos.update(tabela.get(chave, ()))
+    return candidatos
+
+
+def _similares(indice, posicao, assinatura, limiar, mesmo_elemento):
+    elementos = indice['linhas']['DES_ELEMENTO']
+    resultado = []
+    for candidato in _candidatos(indice, assinatura):
+        if candidato == posicao:
+            continue
+        if mesmo_elemento and elementos.iat[candidato] != elementos.iat[posicao]:
+            continue
+        similaridade = similaridade_estimada(assinatura, indice['assinaturas'][candidato])
+        if similaridade >= limiar:
+            resultado.append((candidato, similaridade))
+    return resultado
+
+
+def buscar_similares(indice, demanda, limiar=LIMIAR_SIMILARIDADE, mesmo_elemento=True):
+    """Possíveis duplicadas/recorrências de uma demanda, da mais parecida para a menos.
+
+    Retorna um DataFrame vazio se a demanda não existir ou não tiver instrução.
+    """
+    linhas = indice['linhas']
+    posicoes = indice['posicoes_demanda'].get(int(demanda), np.empty(0, dtype=np.intp))
+    encontrados = {}
+    for posicao in posicoes:
+        if indice['vazias'][posicao]:
+            continue
+        for candidato, similaridade in _similares(indice, posicao, indice['assinaturas'][posicao],
+                                                 limiar, mesmo_elemento):
+            if candidato not in posicoes:
+                encontrados[candidato] = max(similaridade, encontrados.get(candidato, 0))
+
+    resultado = linhas.iloc[list(encontrados)].assign(SIMILARIDADE=list(encontrados.values()))
+    return resultado.sort_values('SIMILARIDADE', ascending=False)
+
+
+def agrupar_recorrencias(indice, limiar=LIMIAR_SIMILARIDADE, tamanho_minimo=2):
+    """Agrupa demandas parecidas do mesmo DES_ELEMENTO (componentes conexas dos pares similares).
+
+    Retorna uma linha por grupo, dos elementos com mais repetições para os com menos.
+    """
+    pais = {}
+
+    def raiz(i):
+        while pais.get(i, i) != i:
+            pais[i] = pais.get(pais[i], pais[i])
+            i = pais[i]
+        return i
+
+    for posicao in np.flatnonzero(~indice['vazias']):
+        for candidato, _ in _similares(indice, posicao, indice['assinaturas'][posicao], limiar, True):
+            pais.setdefault(posicao, posicao)
+            pais.setdefault(candidato, candidato)
+            raiz_a, raiz_b = raiz(posicao), raiz(candidato)
+            if raiz_a != raiz_b:
+                pais[max(raiz_a, raiz_b)] = min(raiz_a, raiz_b)
+
+    grupos = {}
+    for posicao in pais:
+        grupos.setdefault(raiz(posicao), []).append(posicao)
+
+    linhas = indice['linhas']
+    resumo = []
+    for membros in grupos.values():
+        if len(membros) < tamanho_minimo:
+            continue
+        grupo = linhas.iloc[sorted(membros)]
+        datas = grupo['DAT_INICIO']
+        resumo.append({
+            'DES_ELEMENTO': grupo['DES_ELEMENTO'].iat[0],
+            'QTD_DEMANDAS': len(grupo),
+            'DEMANDAS': ', '.join(grupo['DEMANDA'].astype(int).astype(str)),
+            'PRIMEIRA': datas.min(),
+            'ULTIMA': datas.max(),
+            'DES_INSTRUCAO': grupo['DES_INSTRUCAO'].iat[0],
+        })
+
+    colunas = ['DES_ELEMENTO', 'QTD_DEMANDAS', 'DEMANDAS', 'PRIMEIRA', 'ULTIMA', 'DES_INSTRUCAO']
+    return pd.DataFrame(resumo, columns=colunas).sort_values('QTD_DEMANDAS', ascending=False, ignore_index=True)
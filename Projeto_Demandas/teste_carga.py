@@ -0,0 +1,306 @@
+"""Teste de carga do dashboard_streamlit.py com várias sessões simultâneas.
+
+Cada sessão é um AppTest rodando no seu próprio processo, executando um
+roteiro de interações: pesquisa de demanda, troca de Abrangência/Equipe,
+palavra-chave e período. Um processo por sessão é obrigatório: o AppTest
+altera estado global do Streamlit (Runtime, config) a cada rerun, então
+duas sessões no mesmo processo interferem uma na outra.
+
+Consequência: cada sessão tem o seu próprio st.cache_data. A medição mostra a
+disputa de CPU e memória entre N sessões simultâneas, mas não o ganho do cache
+compartilhado de um servidor real, e o relatório avisa isso. A memória é o pico
+de RSS de cada processo, com a sua própria cópia dos dados, índices e caches.
+O rerun 'inicial' inclui a carga dos dados e sai à parte, fora dos percentis
+gerais.
+"""
+import argparse
+import json
+import multiprocessing
+import queue
+import random
+import re
+import resource
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = str(Path(__file__).with_name('dashboard_streamlit.py'))
+
+DEMANDAS_PADRAO = ['1997196', '1997201']
+PALAVRAS_PADRAO = ['disjuntor', 'bomba', 'painel', 'cpfl']
+
+
+def _widget(lista, label):
+    """Localiza um widget pelo rótulo exibido na tela"""
+    for widget in lista:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"Widget '{label}' não encontrado")
+
+
+def _opcao_bruta(opcao):
+    """Valor original de uma opção de faceta, sem o sufixo de contagem " (n)" do rótulo"""
+    return re.sub(r' \(\d+\)$', '', opcao)
+
+
+# --- Ações do roteiro ---
+# Cada ação recebe o AppTest e um gerador aleatório e devolve o AppTest
+# com o próximo rerun pronto para ser executado.
+
+def acao_pesquisa(at, rng, cfg):
+    campo = _widget(at.text_input, "Digite o número da demanda:")
+    return campo.input(rng.choice(cfg['demandas']))
+
+
+def acao_abrangencia(at, rng, cfg):
+    caixa = _widget(at.selectbox, "Abrangência")
+    return caixa.set_value(_opcao_bruta(rng.choice(caixa.options)))
+
+
+def acao_equipe(at, rng, cfg):
+    caixa = _widget(at.selectbox, "Equipe")
+    return caixa.set_value(_opcao_bruta(rng.choice(caixa.options)))
+
+
+def acao_palavra_chave(at, rng, cfg):
+    campo = _widget(at.text_input, "Palavra-chave na Instrução")
+    palavra = rng.choice(cfg['palavras'])
+    # Simula digitação parcial: o usuário às vezes confirma só o começo da palavra
+    return campo.input(palavra[:rng.randint(3, len(palavra))])
+
+
+def acao_periodo(at, rng, cfg):
+    inicio = _widget(at.date_input, "Data inicial")
+    fim = _widget(at.date_input, "Data final")
+    total_dias = max((fim.value - inicio.value).days, 1)
+    novo_inicio = inicio.value + timedelta(days=rng.randint(0, total_dias // 2))
+    inicio.set_value(novo_inicio)
+    return fim.set_value(novo_inicio + timedelta(days=rng.randint(1, total_dias)))
+
+
+ACOES = {
+    'pesquisa': acao_pesquisa,
+    'abrangencia': acao_abrangencia,
+    'equipe': acao_equipe,
+    'palavra_chave': acao_palavra_chave,
+    'periodo': acao_periodo,
+}
+
+# Pesos aproximados do uso real: filtros são bem mais frequentes que a pesquisa
+PESOS_ACOES = {
+    'pesquisa': 2,
+    'abrangencia': 3,
+    'equipe': 3,
+    'palavra_chave': 2,
+    'periodo': 1,
+}
+
+
+def gerar_roteiro(rng, passos):
+    nomes = list(PESOS_ACOES)
+    pesos = [PESOS_ACOES[nome] for nome in nomes]
+    return rng.choices(nomes, weights=pesos, k=passos)
+
+
+def _executar(at, timeout):
+    """Executa um rerun e devolve (latência, erro); reruns com falha também têm latência"""
+    inicio = time.perf_counter()
+    try:
+        at.run(timeout=timeout)
+    except Exception as e:
+        return time.perf_counter() - inicio, str(e)
+    latencia = time.perf_counter() - inicio
+    if at.exception:
+        return latencia, at.exception[0].message
+    return latencia, None
+
+
+def executar_sessao(id_sessao, cfg):
+    """Executa o roteiro de uma sessão e devolve as latências de cada rerun"""
+    rng = random.Random(cfg['semente'] + id_sessao)
+    roteiro = gerar_roteiro(rng, cfg['passos'])
+    resultado = {'sessao': id_sessao, 'latencias': [], 'erros': [], 'tentativas': 0}
+
+    at = AppTest.from_file(APP_PATH, default_timeout=cfg['timeout'])
+    for nome in ['inicial'] + roteiro:
+        resultado['tentativas'] += 1
+        if nome != 'inicial':
+            time.sleep(rng.uniform(0, cfg['pausa']))
+            try:
+                ACOES[nome](at, rng, cfg)
+            except Exception as e:
+                # A ação nem chegou a disparar um rerun (ex.: widget ausente na tela)
+                resultado['erros'].append((nome, str(e)))
+                continue
+
+        latencia, erro = _executar(at, cfg['timeout'])
+        resultado['latencias'].append((nome, latencia, erro is None))
+        if erro is not None:
+            resultado['erros'].append((nome, erro))
+
+    return resultado
+
+
+def _rss_pico_mib():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB, macOS em bytes
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+
+
+def _processo_sessao(id_sessao, cfg, largada, fila):
+    # Memória já ocupada pelo interpretador e imports, descontada da sessão
+    rss_base = _rss_pico_mib()
+    largada.wait()
+    try:
+        resultado = executar_sessao(id_sessao, cfg)
+    except Exception as e:
+        resultado = {'sessao': id_sessao, 'latencias': [], 'erros': [('sessao', str(e))], 'tentativas': 1}
+    resultado['memoria_mib'] = _rss_pico_mib() - rss_base
+    fila.put(resultado)
+
+
+def executar_sessoes(n, cfg):
+    """Dispara `n` sessões em processos separados, todas começando juntas"""
+    contexto = multiprocessing.get_context('spawn')
+    largada = contexto.Barrier(n)
+    fila = contexto.Queue()
+    processos = [contexto.Process(target=_processo_sessao, args=(i, cfg, largada, fila)) for i in range(n)]
+    for processo in processos:
+        processo.start()
+
+    # Limite generoso: todos os reruns estourando o timeout, mais as pausas e a inicialização
+    prazo = time.monotonic() + (cfg['passos'] + 1) * (cfg['timeout'] + cfg['pausa']) + 120
+    resultados = []
+    while len(resultados) < n and time.monotonic() < prazo:
+        try:
+            resultados.append(fila.get(timeout=1))
+        except queue.Empty:
+            if not any(processo.is_alive() for processo in processos):
+                break
+
+    for processo in processos:
+        processo.join(timeout=5)
+        if processo.is_alive():
+            processo.terminate()
+
+    # Sessões cujo processo morreu ou não respondeu contam como falha total
+    recebidas = {r['sessao'] for r in resultados}
+    for i in range(n):
+        if i not in recebidas:
+            resultados.append({'sessao': i, 'latencias': [], 'erros': [('sessao', "processo não respondeu")],
+                               'tentativas': cfg['passos'] + 1, 'memoria_mib': None})
+    return sorted(resultados, key=lambda r: r['sessao'])
+
+
+def percentis(latencias):
+    valores = np.asarray(latencias) * 1000
+    p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+    return {'n': len(valores), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+
+
+def resumir(resultados, duracao):
+    # O rerun 'inicial' carrega os dados e monta os índices: fica fora do resumo geral
+    interativas = [lat for r in resultados for nome, lat, _ in r['latencias'] if nome != 'inicial']
+    iniciais = [lat for r in resultados for nome, lat, _ in r['latencias'] if nome == 'inicial']
+    por_acao = {}
+    for r in resultados:
+        for nome, lat, _ in r['latencias']:
+            if nome != 'inicial':
+                por_acao.setdefault(nome, []).append(lat)
+
+    tentativas = sum(r['tentativas'] for r in resultados)
+    erros = sum(len(r['erros']) for r in resultados)
+    memorias = [r['memoria_mib'] for r in resultados if r.get('memoria_mib') is not None]
+
+    return {
+        'sessoes': len(resultados),
+        'duracao_s': duracao,
+        'reruns': percentis(interativas) if interativas else None,
+        'reruns_com_falha': sum(not ok for r in resultados for nome, _, ok in r['latencias'] if nome != 'inicial'),
+        'inicial': percentis(iniciais) if iniciais else None,
+        'por_acao': {nome: percentis(lats) for nome, lats in sorted(por_acao.items())},
+        'tentativas': tentativas,
+        'erros': erros,
+        'taxa_erros': erros / tentativas if tentativas else 0.0,
+        'exemplos_erros': [e for r in resultados for e in r['erros']][:5],
+        'memoria_por_processo_mib': {'media': float(np.mean(memorias)), 'max': float(np.max(memorias))}
+        if memorias else None,
+    }
+
+
+def imprimir_relatorio(resumo):
+    print(f"\nSessões: {resumo['sessoes']}  |  Duração: {resumo['duracao_s']:.1f}s  |  "
+          f"Erros: {resumo['erros']}/{resumo['tentativas']} ({resumo['taxa_erros']:.1%})")
+    if resumo['reruns']:
+        geral = resumo['reruns']
+        print(f"Reruns interativos: {geral['n']} ({resumo['reruns_com_falha']} com falha, incluídos)  "
+              f"p50={geral['p50_ms']:.0f}ms  p95={geral['p95_ms']:.0f}ms  p99={geral['p99_ms']:.0f}ms")
+    if resumo['inicial']:
+        inicial = resumo['inicial']
+        print(f"Rerun inicial (carga dos dados e índices, fora do geral): {inicial['n']}  "
+              f"p50={inicial['p50_ms']:.0f}ms  p95={inicial['p95_ms']:.0f}ms  p99={inicial['p99_ms']:.0f}ms")
+
+    print(f"\n{'Ação':<15}{'n':>6}{'p50 (ms)':>12}{'p95 (ms)':>12}{'p99 (ms)':>12}")
+    for nome, p in resumo['por_acao'].items():
+        print(f"{nome:<15}{p['n']:>6}{p['p50_ms']:>12.0f}{p['p95_ms']:>12.0f}{p['p99_ms']:>12.0f}")
+
+    memoria = resumo['memoria_por_processo_mib']
+    if memoria is not None:
+        print(f"\nMemória por processo (pico RSS sem interpretador/imports; cada processo tem a sua "
+              f"cópia dos dados, índices e caches): média {memoria['media']:.1f} MiB, máx {memoria['max']:.1f} MiB")
+
+    print("\nAtenção: cada sessão roda num processo separado, com caches próprios. Os números não "
+          "medem o efeito do cache compartilhado de um servidor 'streamlit run' real.")
+
+    for nome, erro in resumo['exemplos_erros']:
+        print(f"  erro em '{nome}': {erro}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do dashboard de demandas")
+    parser.add_argument('-n', '--sessoes', type=int, default=10, help="sessões simultâneas (um processo cada)")
+    parser.add_argument('--passos', type=int, default=20, help="interações por sessão")
+    parser.add_argument('--pausa', type=float, default=0.5, help="pausa máxima entre interações (s)")
+    parser.add_argument('--timeout', type=float, default=60, help="timeout de cada rerun (s)")
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--demandas', nargs='+', default=DEMANDAS_PADRAO)
+    parser.add_argument('--palavras', nargs='+', default=PALAVRAS_PADRAO)
+    parser.add_argument('--max-erros', type=float, default=0.01,
+                        help="fração máxima de interações com erro antes de sair com código 1")
+    parser.add_argument('--json', help="grava o resumo neste arquivo")
+    args = parser.parse_args()
+
+    cfg = {
+        'passos': args.passos,
+        'pausa': args.pausa,
+        'timeout': args.timeout,
+        'semente': args.semente,
+        'demandas': args.demandas,
+        'palavras': args.palavras,
+    }
+
+    inicio = time.perf_counter()
+    resultados = executar_sessoes(args.sessoes, cfg)
+    duracao = time.perf_counter() - inicio
+
+    resumo = resumir(resultados, duracao)
+    imprimir_relatorio(resumo)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resumo, f, ensure_ascii=False, indent=2)
+
+    if resumo['taxa_erros'] > args.max_erros:
+        print(f"\nTaxa de erros {resumo['taxa_erros']:.1%} acima do limite de {args.max_erros:.1%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
+
+# Como executar (a partir da raiz do repositório, pois os caminhos dos XLS são relativos):
+# python Projeto_Demandas/teste_carga.py -n 20 --passos 30